@@ -1,12 +1,27 @@
 import os
+import codecs
 import json
 import csv
+import hashlib
+import heapq
 import re
+import atexit
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 from dotenv import load_dotenv
 import anthropic
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -16,79 +31,418 @@ DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 CATEGORIES_FILE = os.path.join(DATA_DIR, 'categories.json')
 TRANSACTIONS_FILE = os.path.join(DATA_DIR, 'transactions.json')
 MERCHANT_CACHE_FILE = os.path.join(DATA_DIR, 'merchant_cache.json')
+# Append-only log of single-transaction updates, folded into TRANSACTIONS_FILE
+# whenever the full list is written out
+TRANSACTIONS_LOG = os.path.join(DATA_DIR, 'transactions.log.jsonl')
+
+# Initialize Anthropic client (retries are handled per chunk in _classify_chunk)
+client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+
+# Delay before pending in-memory changes are written back to disk
+FLUSH_DELAY = 0.25
+# Compact the transactions log into the snapshot once it has this many entries
+LOG_COMPACT_THRESHOLD = 500
+
+# In-memory copies of the data files; writes are coalesced and flushed
+# after FLUSH_DELAY instead of rewriting the file on every edit. 'version'
+# is bumped on every change so derived data can be cached against it, and
+# 'mtime' lets edits made to the file on disk be picked up.
+# List-backed files also keep a {key: position} index for O(1) lookups.
+_txn_state = {'file': TRANSACTIONS_FILE, 'data': None, 'dirty': False,
+              'timer': None, 'lock': threading.RLock(), 'mtime': None,
+              'version': 0, 'key': 'id', 'index': None,
+              'log': TRANSACTIONS_LOG, 'log_entries': 0, 'log_size': 0}
+_category_state = {'file': CATEGORIES_FILE, 'data': None, 'dirty': False,
+                   'timer': None, 'lock': threading.RLock(), 'mtime': None,
+                   'version': 0, 'key': 'code', 'index': None, 'indent': True}
+_merchant_state = {'file': MERCHANT_CACHE_FILE, 'data': None, 'dirty': False,
+                   'timer': None, 'lock': threading.RLock(), 'mtime': None,
+                   'version': 0}
+
+# Distinguishes ETags issued by different runs of the server, since the
+# version counters start again from zero
+_BOOT_ID = os.urandom(4).hex()
+
+# Derived data cached against the versions of the files it was built from
+_category_map_cache = {'version': None, 'map': None}
+_prompt_prefix_cache = {'version': None, 'prefix': None}
+_analysis_cache = {'versions': None, 'results': {}}
+
+# Transactions per AI categorization request, and how many requests to run at once
+AI_CHUNK_SIZE = 25
+AI_MAX_WORKERS = 8
+AI_MAX_ATTEMPTS = 3
+# API errors worth retrying; anything else (auth, bad request) fails straight away
+AI_RETRYABLE_ERRORS = (anthropic.RateLimitError, anthropic.APIConnectionError,
+                       anthropic.InternalServerError)
+
+# Tool the model is forced to call, so categorizations come back as structured data
+CATEGORIZE_TOOL = {
+    "name": "categorize",
+    "description": "Record the category chosen for each transaction.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "description": "One entry per transaction, in the order given.",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "category_code": {"type": "string"},
+                        "confidence": {"type": "string", "enum": ["high", "medium", "low"]}
+                    },
+                    "required": ["id", "category_code", "confidence"]
+                }
+            }
+        },
+        "required": ["results"]
+    }
+}
+
+# Precompiled patterns for merchant name extraction
+_SPLIT_MULTISPACE = re.compile(r'\s{2,}')
+_TRAIL_NUM = re.compile(r'\s+\d+$')
+_TRAIL_STATE = re.compile(r'\s+[A-Z]{2,3}$')
+
+
+def _dumps(data, indent=False):
+    """Serialize data to JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(data, indent=2).encode('utf-8')
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+def _etag(*parts):
+    """Build a weak ETag from data versions and request parameters."""
+    # Hashed so client-supplied parameters never reach the header verbatim
+    digest = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=8).hexdigest()
+    return f'W/"{_BOOT_ID}-{digest}"'
+
+
+def _not_modified(etag):
+    """Check whether the client already holds the response tagged etag."""
+    return request.headers.get('If-None-Match') == etag
+
+
+def _json_response(body, etag=None):
+    """Wrap already-serialized JSON bytes in a response."""
+    response = app.response_class(body, mimetype='application/json')
+    if etag is not None:
+        response.headers['ETag'] = etag
+    return response
+
+
+def _loads(raw):
+    """Parse JSON bytes, using orjson when available."""
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 
 def load_json(filepath):
     """Load data from a JSON file."""
     if os.path.exists(filepath):
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            return _loads(f.read())
     return [] if 'categories' in filepath or 'transactions' in filepath else {}
 
 
-def save_json(filepath, data):
-    """Save data to a JSON file."""
+def save_json(filepath, data, indent=False):
+    """Save data to a JSON file (indented only if it is meant to be hand-edited).
+
+    Written to a temp file and renamed over the target, so a crash can never
+    leave a truncated file behind.
+    """
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2)
+    tmp = f"{filepath}.tmp.{os.getpid()}"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_dumps(data, indent))
+        os.replace(tmp, filepath)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _mtime(filepath):
+    """Return a file's modification time in ns, or None if it doesn't exist."""
+    try:
+        return os.stat(filepath).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _log_size(state):
+    """Return the current size of a data file's update log (0 if it has none)."""
+    try:
+        return os.stat(state['log']).st_size if state.get('log') else 0
+    except FileNotFoundError:
+        return 0
+
+
+def _is_stale(state):
+    """Check whether the file or its update log changed outside this process."""
+    return (_mtime(state['file']) != state['mtime'] or
+            _log_size(state) != state.get('log_size', 0))
+
+
+def _get_cached(state):
+    """Return the in-memory copy of a data file, (re)loading it if the file changed."""
+    with state['lock']:
+        if state['data'] is None or (not state['dirty'] and _is_stale(state)):
+            state['mtime'] = _mtime(state['file'])
+            state['data'] = load_json(state['file'])
+            state['version'] += 1
+            if 'index' in state:
+                state['index'] = None
+            if state.get('log'):
+                _replay_log(state)
+            if state.get('migrate') and state['migrate'](state['data']):
+                _mark_dirty(state, now=True)
+        return state['data']
+
+
+def _get_indexed(state):
+    """Return a cached list together with its {key: position} index.
+
+    Both are read under one lock so a concurrent _set_cached can't pair the
+    old list with the new index.
+    """
+    with state['lock']:
+        data = _get_cached(state)
+        if state['index'] is None:
+            key = state['key']
+            state['index'] = {item[key]: i for i, item in enumerate(data)}
+        return data, state['index']
+
+
+def _set_cached(state, data):
+    """Replace the in-memory copy of a data file and write it out now."""
+    with state['lock']:
+        state['data'] = data
+        if 'index' in state:
+            state['index'] = None
+        _mark_dirty(state, now=True)
+
+
+def _mark_dirty(state, now=False):
+    """Schedule a debounced write of the in-memory copy of a data file."""
+    with state['lock']:
+        state['dirty'] = True
+        state['version'] += 1
+        if now:
+            _flush(state)
+        elif state['timer'] is None:
+            state['timer'] = threading.Timer(FLUSH_DELAY, _flush, args=(state,))
+            state['timer'].daemon = True
+            state['timer'].start()
+
+
+def _flush(state):
+    """Atomically write pending changes for a data file to disk."""
+    with state['lock']:
+        if state['timer'] is not None:
+            state['timer'].cancel()
+            state['timer'] = None
+        if not state['dirty']:
+            return
+        filepath = state['file']
+        save_json(filepath, state['data'], state.get('indent', False))
+        state['mtime'] = _mtime(filepath)
+        state['dirty'] = False
+        # The snapshot now includes every logged update
+        if state.get('log') and state['log_entries']:
+            open(state['log'], 'wb').close()
+            state['log_entries'] = 0
+            state['log_size'] = 0
+
+
+def _replay_log(state):
+    """Apply logged updates on top of a freshly loaded snapshot."""
+    state['log_entries'] = 0
+    state['log_size'] = 0
+    if not os.path.exists(state['log']):
+        return
+    key = state['key']
+    by_key = {item[key]: item for item in state['data']}
+    damaged = False
+    with open(state['log'], 'rb') as f:
+        for line in f:
+            state['log_entries'] += 1
+            try:
+                entry = _loads(line)
+            except ValueError:
+                # A torn write; skip it and keep applying what follows
+                damaged = True
+                continue
+            item = by_key.get(entry['id'])
+            if item is not None and entry['op'] == 'update':
+                item.update(entry['fields'])
+        state['log_size'] = f.tell()
+    if damaged:
+        # Compact now so new appends don't land on the end of the fragment
+        _mark_dirty(state, now=True)
+
+
+def _log_transaction_update(trans_id, fields):
+    """Record a single-transaction update by appending it to the log."""
+    line = _dumps({'op': 'update', 'id': trans_id, 'fields': fields}) + b'\n'
+    with _txn_state['lock']:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        with open(TRANSACTIONS_LOG, 'ab+', buffering=0) as f:
+            # If the log ends in a torn write, start a fresh line rather than
+            # appending onto the fragment
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = b'\n' + line
+            f.write(line)
+            # Only vouch for the new size if nobody else appended since we
+            # last looked; otherwise leave it stale so the next read reloads
+            if size == _txn_state['log_size']:
+                _txn_state['log_size'] = os.fstat(f.fileno()).st_size
+        _txn_state['version'] += 1
+        _txn_state['log_entries'] += 1
+        if _txn_state['log_entries'] >= LOG_COMPACT_THRESHOLD:
+            _mark_dirty(_txn_state, now=True)
+
+
+def _migrate_amounts(transactions):
+    """Convert legacy float dollar amounts to integer cents, in place."""
+    changed = False
+    for t in transactions:
+        if isinstance(t['amount'], float):
+            t['amount'] = int(round(t['amount'] * 100))
+            changed = True
+    return changed
+
+
+_txn_state['migrate'] = _migrate_amounts
+
+
+def get_transactions():
+    """Get the cached transactions list."""
+    return _get_cached(_txn_state)
+
 
+def get_transactions_indexed():
+    """Get the cached transactions list and its {id: position} index."""
+    return _get_indexed(_txn_state)
 
+
+def get_categories():
+    """Get the cached categories list."""
+    return _get_cached(_category_state)
+
+
+def get_categories_indexed():
+    """Get the cached categories list and its {code: position} index."""
+    return _get_indexed(_category_state)
+
+
+def get_category_map():
+    """Get {code: category}, rebuilt only when the categories change."""
+    categories = get_categories()
+    version = _category_state['version']
+    if _category_map_cache['version'] != version:
+        _category_map_cache['map'] = {c['code']: c for c in categories}
+        _category_map_cache['version'] = version
+    return _category_map_cache['map']
+
+
+def get_merchant_cache():
+    """Get the cached merchant -> category mappings."""
+    return _get_cached(_merchant_state)
+
+
+def _flush_transactions():
+    """Write pending transaction changes to disk."""
+    _flush(_txn_state)
+
+
+def _flush_merchant_cache():
+    """Write pending merchant cache changes to disk."""
+    _flush(_merchant_state)
+
+
+atexit.register(_flush_transactions)
+atexit.register(_flush_merchant_cache)
+
+
+@lru_cache(maxsize=4096)
 def extract_merchant_name(description):
     """Extract a clean merchant name from transaction description."""
     # Remove common suffixes and clean up
     desc = description.strip()
     # Remove location info (usually after multiple spaces)
-    desc = re.split(r'\s{2,}', desc)[0]
+    desc = _SPLIT_MULTISPACE.split(desc, maxsplit=1)[0]
     # Remove trailing numbers and codes
-    desc = re.sub(r'\s+\d+$', '', desc)
-    desc = re.sub(r'\s+[A-Z]{2,3}$', '', desc)  # Remove state codes
+    desc = _TRAIL_NUM.sub('', desc)
+    desc = _TRAIL_STATE.sub('', desc)  # Remove state codes
     return desc.strip()
 
 
-def categorize_transactions_batch(transactions, categories):
-    """Categorize multiple transactions using AI in a single batch call."""
-    merchant_cache = load_json(MERCHANT_CACHE_FILE)
-
-    # Separate cached vs uncached transactions
-    uncached_transactions = []
-    for t in transactions:
-        merchant = extract_merchant_name(t['description'])
-        if merchant.lower() in merchant_cache:
-            cached = merchant_cache[merchant.lower()]
-            t['ai_suggested_code'] = cached['category_code']
-            t['ai_confidence'] = 'high'
-            t['ai_from_cache'] = True
+def _fast_key(description):
+    """Cheap merchant cache key: the first three lowercased words."""
+    return ' '.join(description.lower().split()[:3])
+
+
+def remember_merchant(merchant_cache, description, category_code, trans_id):
+    """Record a learned merchant -> category mapping in the merchant cache."""
+    entry = {
+        'category_code': category_code,
+        'confidence': 'high',
+        'learned_from': trans_id
+    }
+    merchant_key = extract_merchant_name(description).lower()
+    merchant_cache[merchant_key] = entry
+    # The fast probe key only points at the merchant key, so the latest
+    # mapping for the merchant always wins whichever description taught it.
+    # Never written over a real entry that happens to share the same key.
+    fast_key = _fast_key(description)
+    existing = merchant_cache.get(fast_key)
+    if fast_key != merchant_key and (existing is None or 'merchant' in existing):
+        if existing is None or existing['merchant'] == merchant_key:
+            merchant_cache[fast_key] = {'merchant': merchant_key}
         else:
-            uncached_transactions.append(t)
-
-    if not uncached_transactions:
-        return transactions
-
-    # Build category list for prompt
-    category_list = "\n".join([
-        f"- {c['code']}: {c['name']} ({c['category_type']})"
-        for c in categories
-    ])
-
-    # Build transaction list for prompt
-    transaction_list = "\n".join([
-        f"{i+1}. [{t['date']}] {t['description']} | ${abs(float(t['amount'])):.2f} ({'expense' if float(t['amount']) < 0 else 'income'})"
-        for i, t in enumerate(uncached_transactions)
-    ])
-
-    prompt = f"""Categorize these bank transactions. For each transaction, determine the best category.
+            # Shared by more than one merchant; lookups must extract the name
+            merchant_cache[fast_key] = {'merchant': None}
+
+
+def lookup_merchant(merchant_cache, description):
+    """Find the learned merchant -> category mapping for a description, if any."""
+    # Try the fast key's pointer first to skip the regexes, unless it is
+    # ambiguous between merchants
+    pointer = merchant_cache.get(_fast_key(description))
+    if pointer is not None and pointer.get('merchant'):
+        cached = merchant_cache.get(pointer['merchant'])
+        if cached is not None and 'merchant' not in cached:
+            return cached
+    cached = merchant_cache.get(extract_merchant_name(description).lower())
+    if cached is not None and 'merchant' not in cached:
+        return cached
+    return None
+
+
+def _get_prompt_prefix(categories):
+    """Get the instructions and category list, rebuilt only when categories change."""
+    version = _category_state['version']
+    if _prompt_prefix_cache['version'] != version:
+        # Build category list for prompt
+        category_list = "\n".join([
+            f"- {c['code']}: {c['name']} ({c['category_type']})"
+            for c in categories
+        ])
+        _prompt_prefix_cache['prefix'] = f"""Categorize bank transactions. For each transaction, determine the best category.
 
 Available categories:
 {category_list}
 
-Transactions to categorize:
-{transaction_list}
-
-Respond with ONLY a JSON array, one object per transaction in order:
-[{{"id": 1, "category_code": "XXX", "confidence": "high/medium/low"}}, ...]
+Call the categorize tool with one result per transaction, in order.
 
 Rules:
 - Positive amounts (income) should use category "1000"
@@ -101,30 +455,90 @@ Rules:
 - Entertainment (museums, cinemas) = "800"
 - Phone/utilities (Optus) = "900"
 - If unsure, use "500" with low confidence"""
+        _prompt_prefix_cache['version'] = version
+    return _prompt_prefix_cache['prefix']
 
-    try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        response_text = response.content[0].text.strip()
-        # Extract JSON array from response
-        json_match = re.search(r'\[[\s\S]*\]', response_text)
-        if json_match:
-            results = json.loads(json_match.group())
-            for i, result in enumerate(results):
-                if i < len(uncached_transactions):
-                    uncached_transactions[i]['ai_suggested_code'] = result.get('category_code', '500')
-                    uncached_transactions[i]['ai_confidence'] = result.get('confidence', 'low')
-                    uncached_transactions[i]['ai_from_cache'] = False
-    except Exception as e:
-        print(f"AI batch categorization error: {e}")
-        # Fallback: mark all as "other"
-        for t in uncached_transactions:
-            t['ai_suggested_code'] = '500'
-            t['ai_confidence'] = 'low'
+
+def _classify_chunk(chunk, prompt_prefix):
+    """Ask the AI to categorize one chunk of transactions, retrying with backoff."""
+    # Build transaction list for prompt
+    parsed = [(t, t['amount'] / 100) for t in chunk]
+    transaction_list = "\n".join([
+        f"{i+1}. [{t['date']}] {t['description']} | ${abs(amount):.2f} ({'expense' if amount < 0 else 'income'})"
+        for i, (t, amount) in enumerate(parsed)
+    ])
+
+    prompt = f"""Transactions to categorize:
+{transaction_list}"""
+
+    for attempt in range(AI_MAX_ATTEMPTS):
+        try:
+            response = client.messages.create(
+                model="claude-sonnet-4-20250514",
+                max_tokens=2000,
+                tools=[CATEGORIZE_TOOL],
+                tool_choice={"type": "tool", "name": "categorize"},
+                # Identical across chunks and imports, so mark it for prompt caching
+                system=[{"type": "text", "text": prompt_prefix,
+                         "cache_control": {"type": "ephemeral"}}],
+                messages=[{"role": "user", "content": prompt}]
+            )
+            break
+        except AI_RETRYABLE_ERRORS as e:
+            if attempt == AI_MAX_ATTEMPTS - 1:
+                raise
+            print(f"AI categorization error (attempt {attempt + 1}), retrying: {e}")
+            time.sleep(2 ** attempt)
+
+    # The forced tool call comes back as already-parsed structured input
+    for block in response.content:
+        if block.type == 'tool_use':
+            return block.input.get('results', [])
+    return []
+
+
+def categorize_transactions_batch(transactions, categories):
+    """Categorize multiple transactions using AI, in concurrent batched calls."""
+    merchant_cache = get_merchant_cache()
+
+    # Separate cached vs uncached transactions
+    uncached_transactions = []
+    for t in transactions:
+        cached = lookup_merchant(merchant_cache, t['description'])
+        if cached:
+            t['ai_suggested_code'] = cached['category_code']
+            t['ai_confidence'] = 'high'
+            t['ai_from_cache'] = True
+        else:
+            uncached_transactions.append(t)
+
+    if not uncached_transactions:
+        return transactions
+
+    prompt_prefix = _get_prompt_prefix(categories)
+
+    # Split into chunks so large imports don't overflow one response, and
+    # send the chunks concurrently
+    chunks = [uncached_transactions[i:i + AI_CHUNK_SIZE]
+              for i in range(0, len(uncached_transactions), AI_CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=min(AI_MAX_WORKERS, len(chunks))) as executor:
+        futures = [executor.submit(_classify_chunk, chunk, prompt_prefix) for chunk in chunks]
+
+    for chunk, future in zip(chunks, futures):
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"AI batch categorization error: {e}")
+            # Fallback: mark the whole chunk as "other"
+            for t in chunk:
+                t['ai_suggested_code'] = '500'
+                t['ai_confidence'] = 'low'
+                t['ai_from_cache'] = False
+            continue
+
+        for t, result in zip(chunk, results):
+            t['ai_suggested_code'] = result.get('category_code', '500')
+            t['ai_confidence'] = result.get('confidence', 'low')
             t['ai_from_cache'] = False
 
     return transactions
@@ -137,18 +551,20 @@ def index():
 
 @app.route('/accounts')
 def accounts():
-    categories = load_json(CATEGORIES_FILE)
+    categories = get_categories()
     return render_template('accounts.html', categories=categories)
 
 
 @app.route('/api/categories', methods=['GET', 'POST'])
 def api_categories():
-    categories = load_json(CATEGORIES_FILE)
+    categories = get_categories()
+    etag = _etag(_category_state['version'])
 
     if request.method == 'POST':
         data = request.json
+        categories, index = get_categories_indexed()
         # Check for duplicate code
-        if any(c['code'] == data['code'] for c in categories):
+        if data['code'] in index:
             return jsonify({'error': 'Category code already exists'}), 400
 
         categories.append({
@@ -157,30 +573,37 @@ def api_categories():
             'type': data.get('type', 'variable'),
             'category_type': data.get('category_type', 'Expense')
         })
-        save_json(CATEGORIES_FILE, categories)
+        index[data['code']] = len(categories) - 1
+        _mark_dirty(_category_state, now=True)
         return jsonify({'success': True})
 
-    return jsonify(categories)
+    if _not_modified(etag):
+        return '', 304, {'ETag': etag}
+    response = jsonify(categories)
+    response.headers['ETag'] = etag
+    return response
 
 
 @app.route('/api/categories/<code>', methods=['PUT', 'DELETE'])
 def api_category(code):
-    categories = load_json(CATEGORIES_FILE)
+    categories = get_categories()
 
     if request.method == 'DELETE':
+        # Deletions are rare, so just rebuild the list and its index
         categories = [c for c in categories if c['code'] != code]
-        save_json(CATEGORIES_FILE, categories)
+        _set_cached(_category_state, categories)
         return jsonify({'success': True})
 
     if request.method == 'PUT':
         data = request.json
-        for c in categories:
-            if c['code'] == code:
-                c['name'] = data.get('name', c['name'])
-                c['type'] = data.get('type', c['type'])
-                c['category_type'] = data.get('category_type', c['category_type'])
-                break
-        save_json(CATEGORIES_FILE, categories)
+        categories, index = get_categories_indexed()
+        idx = index.get(code)
+        if idx is not None:
+            c = categories[idx]
+            c['name'] = data.get('name', c['name'])
+            c['type'] = data.get('type', c['type'])
+            c['category_type'] = data.get('category_type', c['category_type'])
+            _mark_dirty(_category_state, now=True)
         return jsonify({'success': True})
 
     return jsonify({'error': 'Method not allowed'}), 405
@@ -188,11 +611,9 @@ def api_category(code):
 
 @app.route('/reconciliation')
 def reconciliation():
-    categories = load_json(CATEGORIES_FILE)
-    transactions = load_json(TRANSACTIONS_FILE)
-    return render_template('reconciliation.html',
-                         categories=categories,
-                         transactions=transactions)
+    # Transactions are fetched by the page from /api/transactions
+    categories = get_categories()
+    return render_template('reconciliation.html', categories=categories)
 
 
 @app.route('/api/upload-csv', methods=['POST'])
@@ -205,37 +626,46 @@ def upload_csv():
         return jsonify({'error': 'No file selected'}), 400
 
     try:
-        # Read CSV
-        content = file.read().decode('utf-8')
-        reader = csv.reader(content.splitlines())
+        # Stream CSV rows straight from the upload rather than decoding it whole
+        # (iterdecode rather than TextIOWrapper: before 3.11 the upload's
+        # SpooledTemporaryFile lacks the methods TextIOWrapper needs)
+        reader = csv.reader(codecs.iterdecode(file.stream, 'utf-8'))
 
-        transactions = load_json(TRANSACTIONS_FILE)
-        categories = load_json(CATEGORIES_FILE)
-        existing_ids = {t.get('id') for t in transactions}
+        transactions = get_transactions()
+        categories = get_categories()
+        # Match rows against what's already imported before building an ID
+        existing_fps = {(t['date'], abs(t['amount']), t['description']) for t in transactions}
 
         new_transactions = []
         for row in reader:
             if len(row) >= 3:
                 date_str, amount_str, description = row[0], row[1], row[2]
 
-                # Parse date (DD/MM/YYYY format)
-                try:
-                    date_obj = datetime.strptime(date_str, '%d/%m/%Y')
-                    date_formatted = date_obj.strftime('%Y-%m-%d')
-                except ValueError:
-                    date_formatted = date_str
-
-                # Parse amount (remove quotes and +/- signs for storage)
+                # Parse date (DD/MM/YYYY format); slice the common zero-padded
+                # form directly and only fall back to strptime for anything else
+                d = date_str
+                if (len(d) == 10 and d[2] == '/' and d[5] == '/' and
+                        d[:2].isdigit() and d[3:5].isdigit() and d[6:].isdigit()):
+                    date_formatted = f"{d[6:10]}-{d[3:5]}-{d[0:2]}"
+                else:
+                    try:
+                        date_obj = datetime.strptime(date_str, '%d/%m/%Y')
+                        date_formatted = date_obj.strftime('%Y-%m-%d')
+                    except ValueError:
+                        date_formatted = date_str
+
+                # Parse amount (remove quotes and +/- signs); stored as integer cents
                 amount = float(amount_str.replace('"', '').replace(',', ''))
+                amount_cents = int(round(amount * 100))
 
-                # Create unique ID
-                trans_id = f"{date_formatted}_{abs(amount)}_{hash(description) % 10000}"
-
-                if trans_id not in existing_ids:
+                if (date_formatted, abs(amount_cents), description.strip()) not in existing_fps:
+                    # Create unique ID (blake2b rather than hash() so it is stable across restarts)
+                    digest = hashlib.blake2b(description.encode('utf-8'), digest_size=3).hexdigest()
+                    trans_id = f"{date_formatted}_{abs(amount)}_{digest}"
                     new_transactions.append({
                         'id': trans_id,
                         'date': date_formatted,
-                        'amount': amount,
+                        'amount': amount_cents,
                         'description': description.strip(),
                         'category_code': None,
                         'reconciled': False
@@ -244,10 +674,12 @@ def upload_csv():
         # AI categorize new transactions
         if new_transactions:
             new_transactions = categorize_transactions_batch(new_transactions, categories)
-            transactions.extend(new_transactions)
-            # Sort by date descending
-            transactions.sort(key=lambda x: x['date'], reverse=True)
-            save_json(TRANSACTIONS_FILE, transactions)
+            # Sort by date descending; the stored list already is, so merge
+            # the two instead of re-sorting everything
+            new_transactions.sort(key=itemgetter('date'), reverse=True)
+            transactions = list(heapq.merge(transactions, new_transactions,
+                                            key=itemgetter('date'), reverse=True))
+            _set_cached(_txn_state, transactions)
 
         return jsonify({
             'success': True,
@@ -261,7 +693,11 @@ def upload_csv():
 
 @app.route('/api/transactions', methods=['GET'])
 def api_transactions():
-    transactions = load_json(TRANSACTIONS_FILE)
+    transactions = get_transactions()
+    etag = _etag(_txn_state['version'], request.query_string)
+    if _not_modified(etag):
+        return '', 304, {'ETag': etag}
+
     filter_type = request.args.get('filter', 'all')
 
     if filter_type == 'unreconciled':
@@ -269,37 +705,41 @@ def api_transactions():
     elif filter_type == 'reconciled':
         transactions = [t for t in transactions if t.get('reconciled')]
 
-    return jsonify(transactions)
+    # Optional paging, so clients don't have to pull the whole history
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'error': 'offset and limit must not be negative'}), 400
+    if limit is not None:
+        transactions = transactions[offset:offset + limit]
+    elif offset:
+        transactions = transactions[offset:]
+
+    response = jsonify(transactions)
+    response.headers['ETag'] = etag
+    return response
 
 
 @app.route('/api/transactions/<trans_id>', methods=['PUT'])
 def api_transaction(trans_id):
-    transactions = load_json(TRANSACTIONS_FILE)
+    transactions, index = get_transactions_indexed()
     data = request.json
 
-    for t in transactions:
-        if t['id'] == trans_id:
-            if 'category_code' in data:
-                t['category_code'] = data['category_code']
-            if 'reconciled' in data:
-                t['reconciled'] = data['reconciled']
-            if 'note' in data:
-                t['note'] = data['note']
-
-            # Update merchant cache if user changed category
-            if data.get('category_code') and data.get('update_cache', True):
-                merchant = extract_merchant_name(t['description'])
-                merchant_cache = load_json(MERCHANT_CACHE_FILE)
-                merchant_cache[merchant.lower()] = {
-                    'category_code': data['category_code'],
-                    'confidence': 'high',
-                    'learned_from': trans_id
-                }
-                save_json(MERCHANT_CACHE_FILE, merchant_cache)
+    idx = index.get(trans_id)
+    if idx is None:
+        return jsonify({'error': 'Transaction not found'}), 404
+    t = transactions[idx]
 
-            break
+    fields = {k: data[k] for k in ('category_code', 'reconciled', 'note') if k in data}
+    t.update(fields)
+
+    # Update merchant cache if user changed category
+    if data.get('category_code') and data.get('update_cache', True):
+        remember_merchant(get_merchant_cache(), t['description'],
+                          data['category_code'], trans_id)
+        _mark_dirty(_merchant_state)
 
-    save_json(TRANSACTIONS_FILE, transactions)
+    _log_transaction_update(trans_id, fields)
     return jsonify({'success': True})
 
 
@@ -313,33 +753,29 @@ def reconcile_transaction():
     if not trans_id or not category_code:
         return jsonify({'error': 'Missing transaction_id or category_code'}), 400
 
-    transactions = load_json(TRANSACTIONS_FILE)
+    transactions, index = get_transactions_indexed()
 
-    for t in transactions:
-        if t['id'] == trans_id:
-            t['category_code'] = category_code
-            t['reconciled'] = True
+    idx = index.get(trans_id)
+    if idx is None:
+        return jsonify({'error': 'Transaction not found'}), 404
+    t = transactions[idx]
 
-            # Update merchant cache
-            merchant = extract_merchant_name(t['description'])
-            merchant_cache = load_json(MERCHANT_CACHE_FILE)
-            merchant_cache[merchant.lower()] = {
-                'category_code': category_code,
-                'confidence': 'high',
-                'learned_from': trans_id
-            }
-            save_json(MERCHANT_CACHE_FILE, merchant_cache)
-            break
+    fields = {'category_code': category_code, 'reconciled': True}
+    t.update(fields)
 
-    save_json(TRANSACTIONS_FILE, transactions)
+    # Update merchant cache
+    remember_merchant(get_merchant_cache(), t['description'],
+                      category_code, trans_id)
+    _mark_dirty(_merchant_state)
+    _log_transaction_update(trans_id, fields)
     return jsonify({'success': True})
 
 
 @app.route('/api/reconcile-all', methods=['POST'])
 def reconcile_all():
     """Reconcile all unreconciled transactions using AI suggestions."""
-    transactions = load_json(TRANSACTIONS_FILE)
-    merchant_cache = load_json(MERCHANT_CACHE_FILE)
+    transactions = get_transactions()
+    merchant_cache = get_merchant_cache()
     reconciled_count = 0
 
     for t in transactions:
@@ -349,35 +785,53 @@ def reconcile_all():
             reconciled_count += 1
 
             # Update merchant cache
-            merchant = extract_merchant_name(t['description'])
-            merchant_cache[merchant.lower()] = {
-                'category_code': t['ai_suggested_code'],
-                'confidence': 'high',
-                'learned_from': t['id']
-            }
+            remember_merchant(merchant_cache, t['description'],
+                              t['ai_suggested_code'], t['id'])
 
-    save_json(TRANSACTIONS_FILE, transactions)
-    save_json(MERCHANT_CACHE_FILE, merchant_cache)
+    _mark_dirty(_txn_state, now=True)
+    _mark_dirty(_merchant_state, now=True)
     return jsonify({'success': True, 'reconciled': reconciled_count})
 
 
+@app.route('/api/compact', methods=['POST'])
+def compact_transactions():
+    """Fold the transactions log into transactions.json."""
+    get_transactions()
+    _mark_dirty(_txn_state, now=True)
+    return jsonify({'success': True})
+
+
 @app.route('/analysis')
 def analysis():
-    categories = load_json(CATEGORIES_FILE)
-    transactions = load_json(TRANSACTIONS_FILE)
-    return render_template('analysis.html',
-                         categories=categories,
-                         transactions=transactions)
+    # Chart data is fetched by the page from /api/analysis
+    categories = get_categories()
+    return render_template('analysis.html', categories=categories)
 
 
 @app.route('/api/analysis')
 def api_analysis():
     """Get analysis data for charts."""
-    transactions = load_json(TRANSACTIONS_FILE)
-    categories = load_json(CATEGORIES_FILE)
+    transactions = get_transactions()
+    category_map = get_category_map()
 
-    # Filter for reconciled expenses only
+    # Filter for reconciled expenses only; anything unrecognised means all,
+    # so arbitrary values share one cache entry and ETag
     transaction_type = request.args.get('type', 'expenses')
+    if transaction_type not in ('expenses', 'income'):
+        transaction_type = 'all'
+
+    versions = (_txn_state['version'], _category_state['version'])
+    etag = _etag(*versions, transaction_type)
+    if _not_modified(etag):
+        return '', 304, {'ETag': etag}
+
+    # Reuse the previous result unless transactions or categories changed
+    if _analysis_cache['versions'] != versions:
+        _analysis_cache['versions'] = versions
+        _analysis_cache['results'] = {}
+    results = _analysis_cache['results']
+    if transaction_type in results:
+        return _json_response(results[transaction_type], etag)
 
     if transaction_type == 'expenses':
         filtered = [t for t in transactions if t.get('reconciled') and t['amount'] < 0]
@@ -387,49 +841,49 @@ def api_analysis():
         filtered = [t for t in transactions if t.get('reconciled')]
 
     # Group by category
-    category_totals = {}
-    category_transactions = {}
+    category_totals = defaultdict(int)
+    category_transactions = defaultdict(list)
 
     for t in filtered:
-        code = t.get('category_code', '500')
-        amount = abs(t['amount'])
-
-        if code not in category_totals:
-            category_totals[code] = 0
-            category_transactions[code] = []
+        code = t.get('category_code') or '500'
+        amount = t['amount']
+        if amount < 0:
+            amount = -amount
 
         category_totals[code] += amount
         category_transactions[code].append(t)
 
     # Build response with category names
-    category_map = {c['code']: c for c in categories}
-
     result = []
-    for code, total in sorted(category_totals.items(), key=lambda x: x[1], reverse=True):
+    for code, total in sorted(category_totals.items(), key=itemgetter(1), reverse=True):
         cat = category_map.get(code, {'name': 'Unknown', 'type': 'variable'})
         result.append({
             'code': code,
             'name': cat['name'],
             'type': cat['type'],
-            'total': round(total, 2),
+            'total': total,
             'transactions': category_transactions[code]
         })
 
-    return jsonify(result)
+    # Cache the serialized body; the response carries every transaction, so
+    # encoding it is the bulk of the work
+    body = results[transaction_type] = _dumps(result)
+    return _json_response(body, etag)
 
 
 @app.route('/api/clear-transactions', methods=['POST'])
 def clear_transactions():
     """Clear all transactions (for testing)."""
-    save_json(TRANSACTIONS_FILE, [])
+    _set_cached(_txn_state, [])
     return jsonify({'success': True})
 
 
 @app.route('/api/clear-data', methods=['POST'])
 def clear_data():
     """Clear all transactions and merchant cache."""
-    save_json(TRANSACTIONS_FILE, [])
-    save_json(MERCHANT_CACHE_FILE, {})
+    _set_cached(_txn_state, [])
+    _set_cached(_merchant_state, {})
+    extract_merchant_name.cache_clear()
     return jsonify({'success': True})
 
 